@@ -1,90 +1,409 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
 import time
+import random
+import collections
 import asyncio
 import datetime
-import requests
-from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
+from email.utils import parsedate_to_datetime
+# httpx and Playwright are imported where they're used, to keep import time down
 
 # ── CONFIG ────────────────────────────────────────────────────────────────────
-DEFAULT_URL = (
+DEFAULT_URL = os.getenv("RMV_URL") or (
     "https://rmvmassdotappt.cxmflow.com/Appointment/Index/"
     "2c052fc7-571f-4b76-9790-7e91f103c408?"
-    "AccessToken=eb2d68aa-722c-463b-a9d8-d95edd1c8d33"
+    "AccessToken=35c884be-fc9c-4316-8cda-ab2079c9149a"
 )
-DATA_ID = "20"  # Worcester button data-id
+DATA_IDS = [d.strip() for d in os.getenv("DATA_IDS", "20").split(",") if d.strip()]  # location button data-ids; 20 = Worcester
+CONCURRENCY = int(os.getenv("CONCURRENCY", "4"))    # locations loaded at the same time
+SLOT_SELECTOR = os.getenv("SLOT_SELECTOR", ".calendar-tile, [data-date]")  # rendered calendar tiles
+RENDER_TIMEOUT_MS = int(os.getenv("RENDER_TIMEOUT_MS", "5000"))
+AVAILABILITY_URL_HINT = "availability"  # substring of the calendar XHR's URL
+if CONCURRENCY < 1:
+    sys.exit("CONCURRENCY must be at least 1")
+
+# ── BROWSER SETTINGS ───────────────────────────────────────────────────────────
+CHROMIUM_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-extensions",
+    "--blink-settings=imagesEnabled=false",
+]
+# assets that play no part in the month check; CSS stays, since innerText
+# only leaves out hidden elements once the page's styles have applied
+BLOCKED_ASSETS = "**/*.{png,jpg,jpeg,gif,svg,ico,woff,woff2,ttf}"
+
+MONTHS = ("jul", "aug", "sep")  # prefixes, so "July"/"August"/"September" match too
+MONTH_NUMBERS = (7, 8, 9)       # same months, as they appear in the XHR JSON
+
+# case‑insensitive, so the page text needn't be lowercased (no copy of the page)
+_MONTH_RE = re.compile(r"\b(?:%s)" % "|".join(map(re.escape, MONTHS)), re.IGNORECASE)
+
+# rendered page text straight from Blink; skips scripts/styles
+PAGE_TEXT_JS = "() => document.body.innerText"
 
 # ── LOOP SETTINGS ──────────────────────────────────────────────────────────────
-LOOP_COUNT    = int(os.getenv("LOOP_COUNT", "5"))     # how many times to retry
-SLEEP_SECONDS = int(os.getenv("SLEEP_SECONDS", "60")) # wait between attempts
+TOTAL_DURATION_SEC = int(os.getenv("TOTAL_DURATION_SEC", "300"))  # keep checking this long
+SLEEP_SECONDS = int(os.getenv("SLEEP_SECONDS", "60")) # initial wait between attempts
+# AIMD on the wait: +POLL_STEP while quiet, ×2 on rate limits, ÷2 after a detection
+POLL_STEP_SECONDS    = 5
+POLL_MIN_SECONDS     = 30   # floor after detections
+POLL_MAX_SECONDS     = 300  # ceiling for additive growth
+POLL_BACKOFF_SECONDS = 600  # ceiling when backing off from rate limits
+FETCH_TRIES   = int(os.getenv("FETCH_TRIES", "4"))    # tries per attempt on transient errors
+RETRY_BASE_SECONDS = 2    # first backoff; doubles per try, plus jitter
+RETRY_CAP_SECONDS  = 300  # never back off longer than 5 min
+if FETCH_TRIES < 1:
+    sys.exit("FETCH_TRIES must be at least 1")
 
 # ── PUSHOVER CONFIG ──────────────────────────────────────────────────────────
 PUSHOVER_API_URL   = "https://api.pushover.net/1/messages.json"
 PUSHOVER_USER_KEY  = os.getenv("PUSHOVER_USER_KEY")
 PUSHOVER_API_TOKEN = os.getenv("PUSHOVER_API_TOKEN")
+# fields that are the same on every push
+_PUSHOVER_BASE = {
+    "token": PUSHOVER_API_TOKEN,
+    "user":  PUSHOVER_USER_KEY,
+    "url":   DEFAULT_URL,
+}
+NOTIFY_MAX_PER_WINDOW = int(os.getenv("NOTIFY_MAX_PER_WINDOW", "5"))     # pushes allowed…
+NOTIFY_WINDOW_SECONDS = int(os.getenv("NOTIFY_WINDOW_SECONDS", "3600"))  # …per this window
+NOTIFY_DEDUPE_SECONDS = int(os.getenv("NOTIFY_DEDUPE_SECONDS", "1800"))  # quiet time per key
+if NOTIFY_MAX_PER_WINDOW < 1:
+    sys.exit("NOTIFY_MAX_PER_WINDOW must be at least 1")
+
+# send times (time.monotonic) of the last NOTIFY_MAX_PER_WINDOW pushes
+_SENT = collections.deque(maxlen=NOTIFY_MAX_PER_WINDOW)
+# dedupe key -> last send time, least recently sent first
+_SENT_BY_KEY = collections.OrderedDict()
+_SENT_BY_KEY_MAX = 64
+# (message, dedupe key) queued by send_notification, pushed together by flush_notifications
+_PENDING: list[tuple[str, str]] = []
+
+# pooled keep‑alive client, created by _client() on the first push
+_CLIENT = None
 
 # ── FUNCTIONS ──────────────────────────────────────────────────────────────────
-async def fetch_after_click() -> str:
-    """Headless‑click the Worcester button and return the resulting HTML."""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        await page.goto(DEFAULT_URL)
-        await page.click(f"button[data-id='{DATA_ID}']")
-        await page.wait_for_timeout(2000)  # allow calendar tiles to render
-        html = await page.content()
-        await browser.close()
-        return html
-
-def page_has_july_or_august(html: str) -> bool:
-    """Return True if 'Jul', 'Aug', or 'Sep' appears in the HTML text."""
-    text = BeautifulSoup(html, "html.parser").get_text(" ", strip=True).lower()
-    return any(m in text for m in ("jul", "aug", "sep"))
-
-def send_notification(message: str, title: str = "RMV Checker"):
-    """Send a push via Pushover, if credentials are set."""
+class RateLimited(Exception):
+    """
+    The RMV site answered 429, 403 (e.g. a Cloudflare block) or 5xx;
+    retry_after is its Retry-After in seconds, if sent.
+    """
+
+    def __init__(self, status: int, retry_after: float | None = None):
+        super().__init__(f"HTTP {status} from RMV site")
+        self.retry_after = retry_after
+
+def _now_iso() -> str:
+    """Current UTC time as an ISO‑8601 string, for log lines and messages."""
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+def _retry_after_seconds(value: str | None) -> float | None:
+    """Parse a Retry-After header (delta‑seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+def _client():
+    """
+    Return the shared httpx.AsyncClient, so repeat notifications skip the
+    TCP/TLS handshake and don't block the event loop the browser runs on.
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        import httpx
+        _CLIENT = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+                retries=3,  # connection failures only
+            ),
+            timeout=10,
+        )
+    return _CLIENT
+
+async def _with_retries(fn, *args, tries: int = FETCH_TRIES):
+    """
+    Await fn(*args), retrying transient browser errors and RateLimited.
+    Honors Retry-After when the site sends one, otherwise backs off
+    exponentially with jitter, capped at RETRY_CAP_SECONDS.
+    """
+    from playwright.async_api import Error as PlaywrightError
+
+    for i in range(tries):
+        try:
+            return await fn(*args)
+        except (PlaywrightError, RateLimited) as e:
+            if i == tries - 1:
+                raise
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after is None:
+                retry_after = RETRY_BASE_SECONDS * 2 ** i + random.uniform(0, 1)
+            delay = min(RETRY_CAP_SECONDS, retry_after)
+            print(f"↻ {e}; retrying in {delay:.1f}s", file=sys.stderr)
+            await asyncio.sleep(delay)
+
+async def fetch_after_click(page, data_id: str) -> str | list | dict:
+    """
+    Click a location's button on an already‑open page and return the calendar
+    XHR's JSON, or the rendered page text if no availability response with
+    recognizable months was seen. A failed click is raised, not swallowed.
+    """
+    from playwright.async_api import TimeoutError as PlaywrightTimeout
+
+    response = await page.goto(DEFAULT_URL)
+    if response is not None and (response.status in (403, 429) or response.status >= 500):
+        raise RateLimited(response.status, _retry_after_seconds(response.headers.get("retry-after")))
+
+    click_failed = False
+    try:
+        async with page.expect_response(
+            lambda r: AVAILABILITY_URL_HINT in r.url.lower(), timeout=RENDER_TIMEOUT_MS
+        ) as response_info:
+            try:
+                await page.click(f"button[data-id='{data_id}']")
+            except Exception:
+                click_failed = True
+                raise
+        response = await response_info.value
+        data = await response.json()
+        if _json_months(data):
+            return data
+    except (PlaywrightTimeout, ValueError):
+        if click_failed:
+            raise
+        # no (JSON) availability response; fall back to the rendered page
+
+    try:
+        # returns as soon as the tiles are on screen instead of a fixed 2s sleep
+        await page.wait_for_selector(SLOT_SELECTOR, state="visible", timeout=RENDER_TIMEOUT_MS)
+    except PlaywrightTimeout:
+        # selector didn't match; settle for the network going quiet
+        try:
+            await page.wait_for_load_state("networkidle", timeout=RENDER_TIMEOUT_MS)
+        except PlaywrightTimeout:
+            pass  # still busy; check whatever has rendered by now
+    return await page.evaluate(PAGE_TEXT_JS)
+
+def page_has_july_or_august(text: str) -> bool:
+    """Return True if a word starting with one of MONTHS ('Jul', 'Aug', 'Sep') appears in the page text."""
+    return _MONTH_RE.search(text) is not None
+
+def _json_months(data) -> list[int]:
+    """Integer "month" fields of the entries in the availability JSON (empty if the shape is unknown)."""
+    entries = data if isinstance(data, list) else [data]
+    return [
+        d["month"] for d in entries if isinstance(d, dict) and isinstance(d.get("month"), int)
+    ]
+
+def json_has_july_or_august(data) -> bool:
+    """Return True if any entry in the availability JSON is in MONTH_NUMBERS."""
+    return any(m in MONTH_NUMBERS for m in _json_months(data))
+
+def _seen_recently(key: str) -> bool:
+    """True if a push for key was delivered within NOTIFY_DEDUPE_SECONDS."""
+    last = _SENT_BY_KEY.get(key)
+    return last is not None and time.monotonic() - last < NOTIFY_DEDUPE_SECONDS
+
+def _mark_sent(keys) -> None:
+    """Record a delivered push and its keys; call only once Pushover accepted it."""
+    now = time.monotonic()
+    _SENT.append(now)
+    for key in keys:
+        _SENT_BY_KEY[key] = now
+        _SENT_BY_KEY.move_to_end(key)
+    while len(_SENT_BY_KEY) > _SENT_BY_KEY_MAX:
+        _SENT_BY_KEY.popitem(last=False)
+
+def _window_allows() -> bool:
+    """
+    Sliding‑window throttle: allow at most NOTIFY_MAX_PER_WINDOW pushes per
+    NOTIFY_WINDOW_SECONDS (pushes are recorded by _mark_sent).
+    """
+    return len(_SENT) < _SENT.maxlen or time.monotonic() - _SENT[0] >= NOTIFY_WINDOW_SECONDS
+
+def send_notification(message: str, key: str | None = None):
+    """
+    Queue a message for the next flush_notifications() push.
+    Messages sharing a key (default: the message itself) are deduplicated.
+    """
+    key = key or message
+    if _seen_recently(key) or any(k == key for _, k in _PENDING):
+        print("🔕 Duplicate notification; skipping", file=sys.stderr)
+        return
+    _PENDING.append((message, key))
+
+async def flush_notifications(title: str = "RMV Checker"):
+    """
+    Send all queued messages as one Pushover push, if credentials are set.
+    A batch that is throttled, or fails with a transport error, 429 or 5xx,
+    stays queued for the next flush; any other 4xx drops it for good.
+    """
+    if not _PENDING:
+        return
     if not (PUSHOVER_USER_KEY and PUSHOVER_API_TOKEN):
         print("⚠️ Pushover keys missing; skipping notification", file=sys.stderr)
+        _PENDING.clear()
+        return
+    if not _window_allows():
+        print("🔕 Notification throttled; keeping it for the next flush", file=sys.stderr)
         return
+    import httpx  # only once there is something to send
 
-    payload = {
-        "token":   PUSHOVER_API_TOKEN,
-        "user":    PUSHOVER_USER_KEY,
-        "title":   title,
-        "message": message,
-        "url":     DEFAULT_URL,
-    }
+    message = "\n".join(m for m, _ in _PENDING)
+    keys = [k for _, k in _PENDING]
+    payload = {**_PUSHOVER_BASE, "title": title, "message": message}
     try:
-        r = requests.post(PUSHOVER_API_URL, data=payload, timeout=10)
+        r = await _client().post(PUSHOVER_API_URL, data=payload)
         r.raise_for_status()
-        print("📲 Pushover notification sent")
-    except requests.RequestException as e:
-        print(f"❌ Notification error: {e}", file=sys.stderr)
+    except httpx.HTTPStatusError as e:
+        status = e.response.status_code
+        if status == 429 or status >= 500:
+            print(f"❌ Notification error: {e}; keeping it for the next flush", file=sys.stderr)
+        else:
+            # rejected request (bad token/user key/payload); resending won't help
+            print(f"❌ Notification rejected: {e}; dropping it", file=sys.stderr)
+            del _PENDING[:len(keys)]
+        return
+    except httpx.HTTPError as e:
+        print(f"❌ Notification error: {e}; keeping it for the next flush", file=sys.stderr)
+        return
+    _mark_sent(keys)
+    del _PENDING[:len(keys)]
+    print("📲 Pushover notification sent")
 
-def main():
-    for attempt in range(LOOP_COUNT):
-        now = datetime.datetime.utcnow().isoformat()
-        try:
-            html = asyncio.run(fetch_after_click())
-            print(f"[{now}] Attempt {attempt+1}/{LOOP_COUNT} — fetched {len(html)} chars")
-            snippet = html[:200].replace("\n"," ")
+async def check_location(page, data_id: str, attempt: int, now: str, slots: asyncio.Semaphore) -> str:
+    """
+    Run a single fetch + month check for one location on its own page.
+    Returns "found", "clear", "rate_limited" or "error".
+    """
+    async def fetch():
+        if page.is_closed():  # not worth retrying; main() reopens it after this attempt
+            raise RuntimeError("page is closed")
+        # hold a concurrency slot only while loading, not while backing off
+        async with slots:
+            return await fetch_after_click(page, data_id)
+
+    try:
+        body = await _with_retries(fetch)
+        if isinstance(body, str):
+            print(f"[{now}] #{data_id} Attempt {attempt+1} — fetched {len(body)} chars")
+            snippet = body[:200].replace("\n"," ")
             print("  Snippet:", snippet, "…")
-            if page_has_july_or_august(html):
-                msg = f"Slots in July/August detected at {now}!"
-                print("✅", msg)
-                send_notification(msg)
-                # return  # stop further loops once found
-            else:
-                print("❌ No July/August slots this time.")
-        except Exception as e:
-            print(f"[{now}] ❌ Error in fetch attempt: {e}", file=sys.stderr)
-
-        # only sleep if more attempts remain
-        if attempt < LOOP_COUNT - 1:
-            print(f"⏳ Sleeping {SLEEP_SECONDS}s before next check...\n")
-            time.sleep(SLEEP_SECONDS)
+            found = page_has_july_or_august(body)
+        else:
+            print(f"[{now}] #{data_id} Attempt {attempt+1} — got availability JSON")
+            found = json_has_july_or_august(body)
+        if found:
+            msg = f"Slots in July/August detected for location {data_id} at {now}!"
+            print("✅", msg)
+            send_notification(msg, key=data_id)
+            return "found"
+        print(f"❌ #{data_id} No July/August slots this time.")
+        return "clear"
+    except RateLimited as e:
+        print(f"[{now}] #{data_id} ❌ Rate limited: {e}", file=sys.stderr)
+        return "rate_limited"
+    except Exception as e:
+        print(f"[{now}] #{data_id} ❌ Error in fetch attempt: {e}", file=sys.stderr)
+        return "error"
+
+async def check_once(pages: dict, attempt: int, slots: asyncio.Semaphore) -> list[str]:
+    """Check every location concurrently, at most CONCURRENCY at a time."""
+    now = _now_iso()  # one timestamp per attempt, shared by all locations
+    return await asyncio.gather(*(
+        check_location(page, data_id, attempt, now, slots) for data_id, page in pages.items()
+    ))
+
+def next_interval(interval: float, outcomes: list[str]) -> float:
+    """
+    Adjust the polling interval from one attempt's outcomes (AIMD). Only
+    rate limits, blocks and 5xx ("rate_limited") back off multiplicatively;
+    other errors are often local (bad DATA_IDS entry, selector timeout) and
+    count like a quiet attempt.
+    """
+    if "rate_limited" in outcomes:
+        return min(POLL_BACKOFF_SECONDS, interval * 2)
+    if "found" in outcomes:
+        return max(POLL_MIN_SECONDS, interval / 2)
+    return min(POLL_MAX_SECONDS, interval + POLL_STEP_SECONDS)
+
+async def _launch(p):
+    """Start Chromium and a context that aborts BLOCKED_ASSETS."""
+    browser = await p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+    context = await browser.new_context()
+    await context.route(BLOCKED_ASSETS, lambda route: route.abort())
+    return browser, context
+
+async def _open_page(context, data_id: str, crashed: set):
+    """Open a location's page, noting its data_id in crashed if it ever crashes."""
+    page = await context.new_page()
+    page.on("crash", lambda _: crashed.add(data_id))
+    return page
+
+async def _revive(p, browser, context, pages: dict, crashed: set):
+    """
+    Relaunch the browser if it died, and reopen any location page that was
+    closed or crashed, so one failure doesn't sink the rest of the run.
+    Returns the (possibly new) browser and context; pages is updated in place.
+    """
+    if not browser.is_connected():
+        print("♻️ Browser gone; relaunching", file=sys.stderr)
+        browser, context = await _launch(p)
+        crashed.clear()
+        for data_id in pages:
+            pages[data_id] = await _open_page(context, data_id, crashed)
+        return browser, context
+
+    for data_id, page in pages.items():
+        if page.is_closed() or data_id in crashed:
+            print(f"♻️ #{data_id} Page closed or crashed; reopening", file=sys.stderr)
+            crashed.discard(data_id)
+            if not page.is_closed():
+                await page.close()
+            pages[data_id] = await _open_page(context, data_id, crashed)
+    return browser, context
+
+async def main():
+    from playwright.async_api import async_playwright
+
+    # one long‑lived process for the whole TOTAL_DURATION_SEC: one browser/context,
+    # plus one page per location, instead of a launch per attempt
+    async with async_playwright() as p:
+        browser, context = await _launch(p)
+        crashed = set()  # data_ids whose page crashed since it was opened
+        pages = {data_id: await _open_page(context, data_id, crashed) for data_id in DATA_IDS}
+        slots = asyncio.Semaphore(CONCURRENCY)
+        interval = SLEEP_SECONDS
+        start = time.monotonic()
+        attempt = 0
+        try:
+            while True:
+                outcomes = await check_once(pages, attempt, slots)
+                await flush_notifications()  # one push for every location that hit
+                browser, context = await _revive(p, browser, context, pages, crashed)
+                interval = next_interval(interval, outcomes)
+                attempt += 1
+
+                # only sleep if another check fits in the run
+                if time.monotonic() - start + interval >= TOTAL_DURATION_SEC:
+                    break
+                print(f"⏳ Sleeping {interval:.0f}s before next check...\n")
+                await asyncio.sleep(interval)
+        finally:
+            await flush_notifications()
+            await browser.close()
+            if _CLIENT is not None:
+                await _CLIENT.aclose()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())